@@ -1,9 +1,12 @@
+import asyncio
+import hmac
 import logging
-import json
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Optional
 
+import orjson
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -15,7 +18,7 @@ from livekit.agents import (
     WorkerOptions,
     cli,
     metrics,
-    tokenize,
+    tts,
     function_tool,
     RunContext
 )
@@ -27,104 +30,195 @@ logger = logging.getLogger("fraud_agent")
 
 load_dotenv(".env.local")
 
-# Load fraud cases database
+# Fraud cases database: the JSON file is the base snapshot, and status updates
+# are appended to the JSONL log and replayed on load (see compact_fraud_cases)
 FRAUD_CASES_FILE = Path("../shared-data/fraud_cases.json")
-fraud_cases = []
-if FRAUD_CASES_FILE.exists():
-    with open(FRAUD_CASES_FILE, "r") as f:
-        fraud_cases = json.load(f)
-        logger.info(f"Loaded {len(fraud_cases)} fraud cases from database")
-else:
-    logger.warning(f"Fraud cases file not found: {FRAUD_CASES_FILE}")
-
-# Session state
-session_state = {
-    "current_case": None,
-    "verification_passed": False,
-    "verification_attempts": 0,
-    "transaction_confirmed": None,
-    "call_completed": False
-}
-
-
-def save_fraud_cases():
-    """Save the updated fraud cases back to the database"""
-    with open(FRAUD_CASES_FILE, "w") as f:
-        json.dump(fraud_cases, f, indent=2)
+FRAUD_CASE_UPDATES_FILE = Path("../shared-data/fraud_cases.updates.jsonl")
+
+
+def normalize_key(value: str) -> str:
+    """Normalize a spoken name or answer for case-insensitive comparison"""
+    return value.lower().strip()
+
+
+def index_fraud_cases(cases: list) -> dict:
+    """Index cases by normalized username for O(1) lookups"""
+    return {case["_userNameKey"]: case for case in cases}
+
+
+def _strip_derived_keys(case: dict) -> dict:
+    """Drop the precomputed "_"-prefixed keys before writing a case to disk"""
+    return {key: value for key, value in case.items() if not key.startswith("_")}
+
+
+def _parse_outcome_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a stored ISO 8601 outcome time so loaded and live cases hold a datetime.
+
+    Raises ValueError or TypeError if the value is not a valid ISO 8601 string.
+    """
+    return datetime.fromisoformat(value) if value else None
+
+
+def load_fraud_cases() -> tuple[list, dict]:
+    """Load the fraud cases database and replay any logged status updates.
+
+    Returns the cases and their username index.
+    """
+    if not FRAUD_CASES_FILE.exists():
+        logger.warning("Fraud cases file not found: %s", FRAUD_CASES_FILE)
+        return [], {}
+
+    cases = orjson.loads(FRAUD_CASES_FILE.read_bytes())
+    # Normalize lookup keys once instead of on every tool call
+    for case in cases:
+        case["_userNameKey"] = normalize_key(case["userName"])
+        case["_securityAnswerKey"] = normalize_key(case["securityAnswer"])
+        try:
+            case["outcomeTime"] = _parse_outcome_time(case.get("outcomeTime"))
+        except (TypeError, ValueError):
+            logger.warning("Ignoring invalid outcomeTime for %s: %s", case["userName"], case["outcomeTime"])
+            case["outcomeTime"] = None
+    cases_by_name = index_fraud_cases(cases)
+
+    replayed = 0
+    if FRAUD_CASE_UPDATES_FILE.exists():
+        for line in FRAUD_CASE_UPDATES_FILE.read_bytes().splitlines():
+            if not line.strip():
+                continue
+            try:
+                update = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A crash mid-append can leave a truncated last line
+                logger.warning("Skipping malformed line in %s", FRAUD_CASE_UPDATES_FILE)
+                continue
+            try:
+                user_name, status, outcome = update["userName"], update["status"], update["outcome"]
+                if not all(isinstance(value, str) for value in (user_name, status, outcome)):
+                    raise TypeError("userName, status and outcome must be strings")
+                outcome_time = _parse_outcome_time(update.get("outcomeTime"))
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Skipping invalid update in %s: %s", FRAUD_CASE_UPDATES_FILE, update)
+                continue
+            case = cases_by_name.get(normalize_key(user_name))
+            if case:
+                case["status"] = status
+                case["outcome"] = outcome
+                case["outcomeTime"] = outcome_time
+                replayed += 1
+
+    logger.info("Loaded %s fraud cases from database (%s updates replayed)", len(cases), replayed)
+    return cases, cases_by_name
+
+
+def compact_fraud_cases():
+    """Fold the update log into the JSON snapshot and clear the log.
+
+    Run offline (no live agent workers) via compact_fraud_cases.py.
+    """
+    cases, _ = load_fraud_cases()
+    FRAUD_CASES_FILE.write_bytes(
+        orjson.dumps([_strip_derived_keys(case) for case in cases], option=orjson.OPT_INDENT_2)
+    )
+    FRAUD_CASE_UPDATES_FILE.unlink(missing_ok=True)
+    logger.info("Compacted fraud cases database (%s cases)", len(cases))
+
+
+@dataclass
+class SessionState:
+    """Per-call conversation state, owned by a single FraudAlertAgent"""
+    current_case: Optional[dict] = None
+    verification_passed: bool = False
+    verification_attempts: int = 0
+    transaction_confirmed: Optional[bool] = None
+    call_completed: bool = False
+    # Background write of this call's outcome, awaited at shutdown
+    pending_save: Optional[asyncio.Task] = None
+
+
+def _append_case_update(data: bytes):
+    """Append a serialized status update to the update log"""
+    with open(FRAUD_CASE_UPDATES_FILE, "ab") as f:
+        f.write(data)
     logger.info("Fraud cases database updated")
 
 
-def find_case_by_username(username: str):
+def _on_save_done(task: asyncio.Task):
+    """Log a finished database write if it failed"""
+    if task.cancelled():
+        logger.error("Fraud cases database write was cancelled")
+    elif task.exception() is not None:
+        logger.error("Failed to save fraud cases database: %s", task.exception())
+
+
+def save_case_update(case: dict) -> asyncio.Task:
+    """Record a case's new status in the database without blocking the call"""
+    # Serialize on the event loop so the worker thread never sees a half-updated case
+    data = orjson.dumps(
+        {
+            "userName": case["userName"],
+            "status": case["status"],
+            "outcome": case["outcome"],
+            "outcomeTime": case["outcomeTime"],
+        }
+    ) + b"\n"
+    task = asyncio.create_task(asyncio.to_thread(_append_case_update, data))
+    task.add_done_callback(_on_save_done)
+    return task
+
+
+async def flush_fraud_cases(state: SessionState):
+    """Wait for the call's in-flight database write, if any, to finish"""
+    if state.pending_save is None:
+        return
+    # Failures are logged by _on_save_done when the write finishes
+    await asyncio.wait([state.pending_save])
+
+
+def find_case_by_username(fraud_index: dict, username: str):
     """Find a fraud case by username (case-insensitive)"""
-    username_lower = username.lower().strip()
-    for case in fraud_cases:
-        if case["userName"].lower() == username_lower:
-            return case
-    return None
+    return fraud_index.get(normalize_key(username))
+
+
+def format_transaction_details(case: dict) -> str:
+    """Describe a case's suspicious transaction, memoized on the case"""
+    details = case.get("_detailsText")
+    if details is None:
+        details = f"""We detected a suspicious transaction on your card ending in {case['cardEnding']}:
+- Amount: {case['transactionAmount']}
+- Merchant: {case['transactionName']}
+- Category: {case['transactionCategory']}
+- Location: {case['transactionLocation']}
+- Time: {case['transactionTime']}
+- Source: {case['transactionSource']}"""
+        case["_detailsText"] = details
+    return details
+
+
+# System prompt shared by every call
+FRAUD_AGENT_INSTRUCTIONS = """You are a fraud detection representative for SecureBank, calling a customer about a suspicious transaction.
+
+FLOW:
+1. Introduce yourself as SecureBank's Fraud Detection Department calling about unusual activity, then ask for their full name.
+2. Call load_fraud_case. If no case is found, apologize and end the call.
+3. Ask their security question and call verify_customer. Max 2 attempts; on failure, end the call for security reasons.
+4. Call get_transaction_details and read it to the customer.
+5. Ask "Did you make this transaction?" and call confirm_transaction with their yes/no.
+6. Tell them the action taken (card stays active, or card blocked, replacement issued and dispute filed), ask if they need anything else, and thank them.
+
+RULES:
+- Never ask for full card numbers, PINs, passwords, or CVV codes.
+- Verify only with the stored security question.
+- Never invent information; use the tools.
+- Keep replies short and clear; re-explain patiently if confused.
+- Be calm, professional, warm and reassuring; this is a security call, not an accusation. Be empathetic if fraud is confirmed."""
 
 
 class FraudAlertAgent(Agent):
-    def __init__(self) -> None:
+    def __init__(self, fraud_index: dict) -> None:
+        self._fraud_index = fraud_index
+        self.state = SessionState()
         super().__init__(
-            instructions="""You are a professional fraud detection representative for SecureBank.
-
-YOUR ROLE:
-You are calling customers about suspicious transactions detected on their accounts. Your job is to:
-1. Introduce yourself clearly and professionally
-2. Verify the customer's identity using their security question
-3. Inform them about the suspicious transaction
-4. Ask if they made the transaction
-5. Take appropriate action based on their response
-
-CONVERSATION FLOW:
-1. GREETING & INTRODUCTION:
-   - "Hello, this is the Fraud Detection Department from SecureBank."
-   - "I'm calling about some unusual activity on your account."
-   - "For security purposes, may I have your full name please?"
-
-2. LOAD CASE:
-   - Once you get the name, use the load_fraud_case tool to find their case
-   - If no case found, politely say you cannot find their account and end the call
-
-3. VERIFICATION:
-   - Ask their security question using the verify_customer tool
-   - You get 2 attempts maximum
-   - If verification fails twice, politely end the call for security reasons
-
-4. TRANSACTION DETAILS:
-   - Once verified, explain the suspicious transaction clearly:
-     - Amount
-     - Merchant name
-     - Location
-     - Time
-     - Card ending in XXXX
-   - Use the get_transaction_details tool to get this information
-
-5. CONFIRMATION:
-   - Ask: "Did you make this transaction?"
-   - Listen for clear yes or no
-   - Use the confirm_transaction tool with their answer
-
-6. CLOSING:
-   - If they confirmed (safe): "Thank you for confirming. We've marked this as a legitimate transaction. Your card remains active."
-   - If they denied (fraud): "I understand. We've immediately blocked your card ending in XXXX and will issue a replacement. A dispute has been filed and you will not be charged for this transaction."
-   - "Is there anything else I can help you with today?"
-   - "Thank you for your time. Have a great day!"
-
-IMPORTANT RULES:
-- Be calm, professional, and reassuring
-- NEVER ask for full card numbers, PINs, passwords, or CVV codes
-- Only use the security question from the database for verification
-- Keep responses concise and clear
-- If the customer seems confused, patiently re-explain
-- Always confirm actions taken at the end
-- Use the tools provided - don't make up information
-
-TONE:
-- Professional but warm
-- Reassuring (this is a security call, not an accusation)
-- Patient and clear
-- Empathetic if fraud is confirmed""",
+            instructions=FRAUD_AGENT_INSTRUCTIONS,
         )
     
     @function_tool
@@ -138,16 +232,16 @@ TONE:
         Args:
             username: The customer's full name
         """
-        logger.info(f"Loading fraud case for: {username}")
+        logger.info("Loading fraud case for: %s", username)
         
-        case = find_case_by_username(username)
+        case = find_case_by_username(self._fraud_index, username)
         
         if case:
-            session_state["current_case"] = case
-            logger.info(f"Found case for {username} - Card ending {case['cardEnding']}")
+            self.state.current_case = case
+            logger.info("Found case for %s - Card ending %s", username, case["cardEnding"])
             return f"Case found for {username}. Security identifier: {case['securityIdentifier']}. Ready to verify customer."
         else:
-            logger.warning(f"No case found for username: {username}")
+            logger.warning("No case found for username: %s", username)
             return f"I apologize, but I cannot find an account under the name {username}. Please verify the spelling or contact our customer service line."
     
     @function_tool
@@ -161,29 +255,30 @@ TONE:
         Args:
             answer: The customer's answer to the security question
         """
-        if not session_state["current_case"]:
+        if not self.state.current_case:
             return "Error: No case loaded. Please provide your name first."
         
-        case = session_state["current_case"]
-        session_state["verification_attempts"] += 1
+        case = self.state.current_case
+        self.state.verification_attempts += 1
         
-        logger.info(f"Verification attempt {session_state['verification_attempts']} for {case['userName']}")
+        logger.info("Verification attempt %s for %s", self.state.verification_attempts, case["userName"])
         
         # Check answer (case-insensitive)
-        correct_answer = case["securityAnswer"].lower().strip()
-        provided_answer = answer.lower().strip()
+        correct_answer = case["_securityAnswerKey"]
+        provided_answer = normalize_key(answer)
         
-        if provided_answer == correct_answer:
-            session_state["verification_passed"] = True
-            logger.info(f"Verification successful for {case['userName']}")
+        # Constant-time compare; str arguments must be ASCII, so compare UTF-8 bytes
+        if hmac.compare_digest(provided_answer.encode(), correct_answer.encode()):
+            self.state.verification_passed = True
+            logger.info("Verification successful for %s", case["userName"])
             return "Verification successful. Thank you for confirming your identity."
         else:
-            attempts_left = 2 - session_state["verification_attempts"]
+            attempts_left = 2 - self.state.verification_attempts
             if attempts_left > 0:
-                logger.warning(f"Verification failed for {case['userName']}. {attempts_left} attempts remaining")
+                logger.warning("Verification failed for %s. %s attempts remaining", case["userName"], attempts_left)
                 return f"I'm sorry, that answer doesn't match our records. You have {attempts_left} attempt(s) remaining."
             else:
-                logger.warning(f"Verification failed - maximum attempts reached for {case['userName']}")
+                logger.warning("Verification failed - maximum attempts reached for %s", case["userName"])
                 return "I'm sorry, but for security reasons, I cannot proceed without proper verification. Please visit your nearest branch or call our customer service line. Goodbye."
     
     @function_tool
@@ -192,23 +287,16 @@ TONE:
         
         Returns the transaction information that should be read to the customer.
         """
-        if not session_state["current_case"]:
+        if not self.state.current_case:
             return "Error: No case loaded."
         
-        if not session_state["verification_passed"]:
+        if not self.state.verification_passed:
             return "Error: Customer not verified yet."
         
-        case = session_state["current_case"]
-        
-        details = f"""We detected a suspicious transaction on your card ending in {case['cardEnding']}:
-- Amount: {case['transactionAmount']}
-- Merchant: {case['transactionName']}
-- Category: {case['transactionCategory']}
-- Location: {case['transactionLocation']}
-- Time: {case['transactionTime']}
-- Source: {case['transactionSource']}"""
+        case = self.state.current_case
+        details = format_transaction_details(case)
         
-        logger.info(f"Transaction details retrieved for {case['userName']}")
+        logger.info("Transaction details retrieved for %s", case["userName"])
         return details
     
     @function_tool
@@ -222,75 +310,85 @@ TONE:
         Args:
             customer_made_transaction: True if legitimate, False if fraudulent
         """
-        if not session_state["current_case"]:
+        if not self.state.current_case:
             return "Error: No case loaded."
         
-        if not session_state["verification_passed"]:
+        if not self.state.verification_passed:
             return "Error: Customer not verified."
         
-        case = session_state["current_case"]
-        session_state["transaction_confirmed"] = customer_made_transaction
-        session_state["call_completed"] = True
+        # Guard against the LLM calling this tool twice; only record the outcome once
+        if self.state.call_completed:
+            return "The customer's response has already been recorded."
         
-        # Update the case in the database
+        case = self.state.current_case
+        self.state.transaction_confirmed = customer_made_transaction
+        self.state.call_completed = True
+        
+        # Update the case in the database; orjson writes outcomeTime as ISO 8601
+        case["outcomeTime"] = datetime.now()
         if customer_made_transaction:
             case["status"] = "confirmed_safe"
-            case["outcome"] = f"Customer confirmed transaction as legitimate on {datetime.now().isoformat()}"
-            logger.info(f"Transaction marked as SAFE for {case['userName']}")
+            case["outcome"] = "Customer confirmed transaction as legitimate"
+            logger.info("Transaction marked as SAFE for %s", case["userName"])
             result = f"Transaction confirmed as safe. Card ending in {case['cardEnding']} remains active. No further action needed."
         else:
             case["status"] = "confirmed_fraud"
-            case["outcome"] = f"Customer denied transaction - marked as fraud on {datetime.now().isoformat()}. Card blocked and dispute filed."
-            logger.info(f"Transaction marked as FRAUD for {case['userName']}")
+            case["outcome"] = "Customer denied transaction - marked as fraud. Card blocked and dispute filed."
+            logger.info("Transaction marked as FRAUD for %s", case["userName"])
             result = f"Transaction marked as fraudulent. Card ending in {case['cardEnding']} has been blocked immediately. A replacement card will be mailed within 3-5 business days. A dispute has been filed and you will not be charged for this transaction."
         
-        # Save to database
-        save_fraud_cases()
+        # Save to database in the background so the response isn't delayed
+        self.state.pending_save = save_case_update(case)
         
         return result
 
 
 def prewarm(proc: JobProcess):
-    """Prewarm the VAD model"""
+    """Prewarm the models and API clients and load the fraud cases database"""
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["bvc"] = noise_cancellation.BVC()
+    proc.userdata["stt"] = deepgram.STT(
+        model="nova-3",
+        language="en-US",
+    )
+    proc.userdata["llm"] = google.LLM(
+        model="gemini-2.5-flash",
+        temperature=0.5,  # Lower temperature for more consistent, professional responses
+    )
+    _, proc.userdata["fraud_index"] = load_fraud_cases()
 
 
 async def entrypoint(ctx: JobContext):
     """Main entrypoint for the fraud alert agent"""
     
-    # Reset session state for new call
-    global session_state
-    session_state = {
-        "current_case": None,
-        "verification_passed": False,
-        "verification_attempts": 0,
-        "transaction_confirmed": None,
-        "call_completed": False
-    }
-    
-    logger.info(f"Starting fraud alert call for room: {ctx.room.name}")
+    logger.info("Starting fraud alert call for room: %s", ctx.room.name)
     
     # Create session with Murf TTS
     session = AgentSession(
-        stt=deepgram.STT(
-            model="nova-3",
-            language="en-US",
-        ),
-        llm=google.LLM(
-            model="gemini-2.5-flash",
-            temperature=0.5,  # Lower temperature for more consistent, professional responses
-        ),
-        tts=murf_tts.TTS(
-            voice="en-US-ryan",
-            style="Conversational",
-            tokenizer=tokenize.basic.SentenceTokenizer(
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
+        # Murf is non-streaming; wrap it explicitly so LLM output is split into
+        # sentences by our lightweight tokenizer rather than the default one
+        tts=tts.StreamAdapter(
+            tts=murf_tts.TTS(
+                voice="en-US-ryan",
+                style="Conversational",
+            ),
+            sentence_tokenizer=murf_tts.PunctuationSentenceTokenizer(
                 min_sentence_len=5,
             ),
         ),
+        # The turn detector needs the job's inference executor, so it can't be prewarmed
         turn_detection=MultilingualModel(),
         vad=ctx.proc.userdata["vad"],
+        # Start LLM inference on partial transcripts to cut turn latency
+        preemptive_generation=True,
+        min_endpointing_delay=0.05,
     )
     
+    # Each call gets its own agent, and with it its own session state
+    fraud_agent = FraudAlertAgent(fraud_index=ctx.proc.userdata["fraud_index"])
+    
     # Metrics collection
     usage_collector = metrics.UsageCollector()
 
@@ -301,29 +399,31 @@ async def entrypoint(ctx: JobContext):
 
     async def log_usage():
         summary = usage_collector.get_summary()
-        logger.info(f"Usage: {summary}")
+        logger.info("Usage: %s", summary)
         
         # Log final call outcome
-        if session_state["call_completed"]:
-            case = session_state["current_case"]
+        if fraud_agent.state.call_completed:
+            case = fraud_agent.state.current_case
             if case:
-                logger.info(f"Call completed - {case['userName']}: {case['status']}")
+                logger.info("Call completed - %s: %s", case["userName"], case["status"])
+
+    async def flush_case_update():
+        await flush_fraud_cases(fraud_agent.state)
 
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(flush_case_update)
 
-    # Start the session with fraud agent
-    fraud_agent = FraudAlertAgent()
-    
+    room_input_options = RoomInputOptions(
+        noise_cancellation=ctx.proc.userdata["bvc"],
+    )
+
+    # Start the session with fraud agent; with room IO, session.start also
+    # connects to the room concurrently with agent startup
     await session.start(
         agent=fraud_agent,
         room=ctx.room,
-        room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(),
-        ),
+        room_input_options=room_input_options,
     )
-
-    # Join the room
-    await ctx.connect()
 # you can do it 
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+"""
+Fold the fraud case update log into fraud_cases.json.
+
+Run this while no agent workers are running, e.g. `uv run python src/compact_fraud_cases.py`.
+"""
+import logging
+
+from agent import compact_fraud_cases
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    compact_fraud_cases()
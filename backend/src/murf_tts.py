@@ -1,16 +1,99 @@
 import asyncio
 import contextlib
+import functools
 import logging
 import os
-from typing import AsyncIterable
+from typing import AsyncIterable, Optional
 import base64
 
 import requests
 from livekit import rtc
 from livekit.agents import tokenize, tts
+from livekit.agents.tokenize import SentenceStream, token_stream
 
 logger = logging.getLogger(__name__)
 
+_SENTENCE_TERMINATORS = ".!?"
+
+# Titles and abbreviations whose period does not end a sentence ("Mr. Smith")
+_ABBREVIATIONS = frozenset({"mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "mt", "vs"})
+
+
+def _is_abbreviation(text: str, idx: int) -> bool:
+    """Check whether the word ending just before `idx` is a known abbreviation"""
+    start = idx
+    while start > 0 and text[start - 1].isalpha():
+        start -= 1
+    return text[start:idx].lower() in _ABBREVIATIONS
+
+
+def _next_terminator(text: str, mark: str, pos: int) -> int:
+    """Find the next `mark` at or after `pos` that ends a sentence, or -1
+
+    The mark must be followed by whitespace, and a period must not follow an
+    abbreviation.
+    """
+    idx = text.find(mark, pos)
+    while idx != -1 and (
+        idx + 1 >= len(text)
+        or not text[idx + 1].isspace()
+        or (mark == "." and _is_abbreviation(text, idx))
+    ):
+        idx = text.find(mark, idx + 1)
+    return idx
+
+
+def split_sentences(text: str, min_sentence_len: int = 20) -> list[tuple[str, int, int]]:
+    """
+    Split text on ".", "!" or "?" followed by whitespace, except after
+    abbreviations such as "Mr." or "Dr.".
+    
+    Sentences shorter than min_sentence_len are merged into the next one. Any
+    trailing text without a terminator is returned as the last sentence.
+    
+    Returns:
+        List of (sentence, start, end) tuples
+    """
+    sentences = []
+    # Next candidate position per terminator, so each is scanned with str.find once
+    next_marks = {mark: _next_terminator(text, mark, 0) for mark in _SENTENCE_TERMINATORS}
+    start = 0
+    while True:
+        found = [idx for idx in next_marks.values() if idx != -1]
+        if not found:
+            break
+        idx = min(found)
+        mark = text[idx]
+        next_marks[mark] = _next_terminator(text, mark, idx + 1)
+        
+        sentence = text[start:idx + 1].strip()
+        if len(sentence) >= min_sentence_len:
+            sentences.append((sentence, start, idx + 1))
+            start = idx + 1
+    
+    tail = text[start:].strip()
+    if tail:
+        sentences.append((tail, start, len(text)))
+    return sentences
+
+
+class PunctuationSentenceTokenizer(tokenize.SentenceTokenizer):
+    """Lightweight sentence tokenizer that splits on terminal punctuation only."""
+    
+    def __init__(self, *, min_sentence_len: int = 20, stream_context_len: int = 10) -> None:
+        self._min_sentence_len = min_sentence_len
+        self._stream_context_len = stream_context_len
+
+    def tokenize(self, text: str, *, language: Optional[str] = None) -> list[str]:
+        return [sentence for sentence, _, _ in split_sentences(text, self._min_sentence_len)]
+
+    def stream(self, *, language: Optional[str] = None) -> SentenceStream:
+        return token_stream.BufferedSentenceStream(
+            tokenizer=functools.partial(split_sentences, min_sentence_len=self._min_sentence_len),
+            min_token_len=self._min_sentence_len,
+            min_ctx_len=self._stream_context_len,
+        )
+
 
 class TTS(tts.TTS):
     def __init__(
@@ -74,7 +157,7 @@ class TTS(tts.TTS):
         }
         
         try:
-            logger.info(f"Synthesizing with Murf: voice={self._voice}, text_length={len(text)}")
+            logger.info("Synthesizing with Murf: voice=%s, text_length=%s", self._voice, len(text))
             response = requests.post(url, json=payload, headers=headers, timeout=30)
             response.raise_for_status()
             
@@ -91,17 +174,17 @@ class TTS(tts.TTS):
                 # Base64 encoded audio
                 return base64.b64decode(response_data['audioContent'])
             else:
-                logger.error(f"Unexpected Murf API response: {response_data}")
+                logger.error("Unexpected Murf API response: %s", response_data)
                 raise ValueError("Unexpected API response format")
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error synthesizing speech with Murf: {e}")
+            logger.error("Error synthesizing speech with Murf: %s", e)
             if 'response' in locals():
-                logger.error(f"Response status: {response.status_code}")
-                logger.error(f"Response body: {response.text[:500]}")
+                logger.error("Response status: %s", response.status_code)
+                logger.error("Response body: %s", response.text[:500])
             raise
         except Exception as e:
-            logger.error(f"Unexpected error in Murf TTS: {e}")
+            logger.error("Unexpected error in Murf TTS: %s", e)
             raise
 
     @contextlib.asynccontextmanager
@@ -137,7 +220,7 @@ class TTS(tts.TTS):
                 
                 yield tts.SynthesizedAudio(request_id="", frame=audio_frame)
             except Exception as e:
-                logger.error(f"Error in synthesize: {e}")
+                logger.error("Error in synthesize: %s", e)
                 raise
         
         yield _do_synthesize()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from datetime import datetime
+
+import orjson
+import pytest
+
+import agent
+
+CASES = [
+    {
+        "userName": "John Smith",
+        "securityAnswer": "Johnson",
+        "status": "pending_review",
+        "outcome": None,
+    },
+    {
+        "userName": "Sarah Johnson",
+        "securityAnswer": "Boston",
+        "status": "pending_review",
+        "outcome": None,
+    },
+]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point the fraud cases database at a temporary snapshot and update log."""
+    cases_file = tmp_path / "fraud_cases.json"
+    updates_file = tmp_path / "fraud_cases.updates.jsonl"
+    cases_file.write_bytes(orjson.dumps(CASES))
+    monkeypatch.setattr(agent, "FRAUD_CASES_FILE", cases_file)
+    monkeypatch.setattr(agent, "FRAUD_CASE_UPDATES_FILE", updates_file)
+    return cases_file, updates_file
+
+
+def _update(user_name: str, status: str) -> bytes:
+    return orjson.dumps({"userName": user_name, "status": status, "outcome": status}) + b"\n"
+
+
+def test_load_replays_updates_onto_snapshot(db) -> None:
+    """Logged updates are applied in order on top of the JSON snapshot."""
+    _, updates_file = db
+    updates_file.write_bytes(
+        _update("john smith", "confirmed_safe") + _update("John Smith", "confirmed_fraud")
+    )
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["status"] == "confirmed_fraud"
+    assert cases[1]["status"] == "pending_review"
+
+
+def test_load_skips_truncated_last_line(db) -> None:
+    """A partially written last line is ignored instead of failing the load."""
+    _, updates_file = db
+    updates_file.write_bytes(_update("Sarah Johnson", "confirmed_safe") + b'{"userName": "Jo')
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["status"] == "pending_review"
+    assert cases[1]["status"] == "confirmed_safe"
+
+
+def test_load_skips_incomplete_update(db) -> None:
+    """A valid JSON line missing required fields is skipped instead of failing the load."""
+    _, updates_file = db
+    updates_file.write_bytes(b'{"userName": "John Smith"}\n' + _update("Sarah Johnson", "confirmed_safe"))
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["status"] == "pending_review"
+    assert cases[1]["status"] == "confirmed_safe"
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b'{"userName": 5, "status": "confirmed_safe", "outcome": "confirmed_safe"}',
+        b'{"userName": "John Smith", "status": "confirmed_safe", "outcome": "confirmed_safe", "outcomeTime": "bad"}',
+    ],
+    ids=["non-string-username", "bad-outcome-time"],
+)
+def test_load_skips_invalid_update(db, line: bytes) -> None:
+    """An update with a wrongly typed field or unparsable time is skipped."""
+    _, updates_file = db
+    updates_file.write_bytes(line + b"\n" + _update("Sarah Johnson", "confirmed_safe"))
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["status"] == "pending_review"
+    assert cases[1]["status"] == "confirmed_safe"
+
+
+def test_load_parses_outcome_time(db) -> None:
+    """Replayed outcome timestamps are datetimes, matching live updates."""
+    _, updates_file = db
+    outcome_time = datetime(2025, 11, 26, 21, 56, 45, 371167)
+    updates_file.write_bytes(
+        orjson.dumps(
+            {
+                "userName": "John Smith",
+                "status": "confirmed_safe",
+                "outcome": "Customer confirmed transaction as legitimate",
+                "outcomeTime": outcome_time,
+            }
+        )
+        + b"\n"
+    )
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["outcomeTime"] == outcome_time
+
+
+def test_compact_folds_log_into_snapshot(db) -> None:
+    """Compaction writes replayed cases without derived keys and removes the log."""
+    cases_file, updates_file = db
+    updates_file.write_bytes(_update("John Smith", "confirmed_fraud"))
+
+    agent.compact_fraud_cases()
+
+    cases = orjson.loads(cases_file.read_bytes())
+    assert cases[0]["status"] == "confirmed_fraud"
+    assert not any(key.startswith("_") for case in cases for key in case)
+    assert not updates_file.exists()
+
+
+async def test_save_case_update_appends_to_log(db) -> None:
+    """A background save is replayed with its status and outcome time on load."""
+    cases, _ = agent.load_fraud_cases()
+    case = cases[0]
+    outcome_time = datetime(2025, 11, 26, 21, 56, 45, 371167)
+    case["status"] = "confirmed_fraud"
+    case["outcome"] = "Customer denied transaction"
+    case["outcomeTime"] = outcome_time
+
+    state = agent.SessionState(pending_save=agent.save_case_update(case))
+    await agent.flush_fraud_cases(state)
+
+    cases, _ = agent.load_fraud_cases()
+    assert cases[0]["status"] == "confirmed_fraud"
+    assert cases[0]["outcomeTime"] == outcome_time
+
+
+async def test_save_case_update_logs_failure(db, monkeypatch, caplog) -> None:
+    """A failed background save is logged as soon as it finishes."""
+    def fail(data: bytes):
+        raise PermissionError("read-only filesystem")
+
+    monkeypatch.setattr(agent, "_append_case_update", fail)
+    cases, _ = agent.load_fraud_cases()
+    case = cases[0]
+    case["status"] = "confirmed_fraud"
+    case["outcome"] = "Customer denied transaction"
+    case["outcomeTime"] = datetime(2025, 11, 26, 21, 56, 45)
+
+    state = agent.SessionState(pending_save=agent.save_case_update(case))
+    with caplog.at_level(logging.ERROR, logger="fraud_agent"):
+        await agent.flush_fraud_cases(state)
+        await asyncio.sleep(0)
+
+    assert "Failed to save fraud cases database" in caplog.text
+
+
+def test_load_parses_snapshot_outcome_time(db) -> None:
+    """Snapshot outcome times survive compaction as datetimes; missing ones are None."""
+    _, updates_file = db
+    outcome_time = datetime(2025, 11, 26, 21, 56, 45, 371167)
+    updates_file.write_bytes(
+        orjson.dumps(
+            {
+                "userName": "John Smith",
+                "status": "confirmed_safe",
+                "outcome": "Customer confirmed transaction as legitimate",
+                "outcomeTime": outcome_time,
+            }
+        )
+        + b"\n"
+    )
+
+    agent.compact_fraud_cases()
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["outcomeTime"] == outcome_time
+    assert cases[1]["outcomeTime"] is None
+
+
+def test_load_ignores_invalid_snapshot_outcome_time(db) -> None:
+    """An unparsable snapshot outcome time is dropped instead of failing the load."""
+    cases_file, _ = db
+    cases_file.write_bytes(orjson.dumps([{**CASES[0], "outcomeTime": "bad"}, CASES[1]]))
+
+    cases, _ = agent.load_fraud_cases()
+
+    assert cases[0]["outcomeTime"] is None
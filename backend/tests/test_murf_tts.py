@@ -0,0 +1,53 @@
+import pytest
+
+from murf_tts import PunctuationSentenceTokenizer, split_sentences
+
+
+def test_split_sentences_merges_short_sentences() -> None:
+    """Sentences shorter than min_sentence_len are merged into the next one."""
+    text = "Hi. I am calling about your card ending 4242. Did you make it?"
+
+    assert split_sentences(text, min_sentence_len=5) == [
+        ("Hi. I am calling about your card ending 4242.", 0, 45),
+        ("Did you make it?", 45, 62),
+    ]
+
+
+def test_split_sentences_keeps_unterminated_tail() -> None:
+    """Trailing text without a terminator is returned as the last sentence."""
+    assert split_sentences("Thank you for confirming. Have a great", min_sentence_len=5) == [
+        ("Thank you for confirming.", 0, 25),
+        ("Have a great", 25, 38),
+    ]
+
+
+def test_split_sentences_ignores_punctuation_inside_amounts() -> None:
+    """A period not followed by whitespace does not end a sentence."""
+    assert split_sentences("The amount was $1,247.99. Is that right?", min_sentence_len=5) == [
+        ("The amount was $1,247.99.", 0, 25),
+        ("Is that right?", 25, 40),
+    ]
+
+
+def test_split_sentences_keeps_honorifics_with_name() -> None:
+    """A period after a title such as "Mr." does not end a sentence."""
+    assert split_sentences("Thank you, Mr. Smith. Is this Dr. Jones?", min_sentence_len=5) == [
+        ("Thank you, Mr. Smith.", 0, 21),
+        ("Is this Dr. Jones?", 21, 40),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_sentences_across_chunks() -> None:
+    """The streaming tokenizer splits text pushed in arbitrary chunks."""
+    tokenizer = PunctuationSentenceTokenizer(min_sentence_len=5)
+    stream = tokenizer.stream()
+
+    for chunk in ["The amount was $1,", "247.99. Did you make", " this transaction?"]:
+        stream.push_text(chunk)
+    stream.end_input()
+
+    sentences = [data.token async for data in stream]
+    await stream.aclose()
+
+    assert sentences == ["The amount was $1,247.99.", "Did you make this transaction?"]